@@ -0,0 +1,224 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from os import makedirs, path
+from time import perf_counter
+import json
+import platform
+import tracemalloc
+
+import dice
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def makeDice(count, quality = (1, 6)):
+    return [dice.Dice(list(quality)) for _ in range(count)]
+
+
+def setUp(args, config = None):
+    dice.seedAll(args.seed)
+    dice.GAME_LENGTH = args.game_length
+    dice.ENGINE = args.engine
+    dice.WORKERS = args.workers
+    dice.VIEW_STANDINGS = False
+    dice.output = dice.StdoutSink()
+    dice.oddsCache.clear()
+    if config:
+        dice.configure(config)
+    dice.newUniverse()
+
+
+# every benchmark prepares its data and returns the operation to time
+
+@benchmark('compare')
+def benchCompare(args):
+    match = dice.Match(*makeDice(2))
+    return match.compare
+
+
+@benchmark('comparePercent')
+def benchComparePercent(args):
+    match = dice.Match(*makeDice(2))
+    return match.calcComparePercent
+
+
+@benchmark('odds')
+def benchOdds(args):
+    counts = dice.Match(*makeDice(2)).compareCounts()
+    return lambda: dice.Match.scoreProbs(*counts, dice.GAME_LENGTH)
+
+
+@benchmark('oddsCached')
+def benchOddsCached(args):
+    match = dice.Match(*makeDice(2))
+    return match.odds
+
+
+@benchmark('play')
+def benchPlay(args):
+    dice.season = 1
+    league = dice.League(1, makeDice(args.dice), 'Benchmark League')
+    # the odds matrices are built on first use, so they are built here rather than in the first timed match
+    league.buildOdds()
+    matches = [match for tour in range(1, league.matchCount + 1) for match in league.fixtures(tour)]
+    position = iter(range(10 ** 12))
+
+    def play():
+        matches[next(position) % len(matches)].play(False, True)
+    return play
+
+
+@benchmark('schedule')
+def benchSchedule(args):
+    league = dice.League(1, makeDice(args.dice), 'Benchmark League')
+    return lambda: [league.pairs(tour) for tour in range(1, league.matchCount + 1)]
+
+
+@benchmark('leagueSim')
+def benchLeagueSim(args):
+    dice.season = 1
+    divDice = makeDice(args.dice)
+    return lambda: dice.League(1, divDice, 'Benchmark League').sim()
+
+
+@benchmark('season')
+def benchSeason(args):
+    def season():
+        dice.simSeason()
+        dice.promote()
+    return season
+
+
+@benchmark('printTable')
+def benchPrintTable(args):
+    dice.season = 1
+    league = dice.League(1, makeDice(args.dice), 'Benchmark League').sim()
+
+    def render():
+        dice.output = dice.MemorySink()
+        league.viewTable()
+    return render
+
+
+def historyUniverse(args):
+    for _ in range(args.history):
+        dice.simSeason()
+        dice.promote()
+    return max(dice.Dice.instances, key = lambda x: len(x.history))
+
+
+@benchmark('viewProfile')
+def benchViewProfile(args):
+    veteran = historyUniverse(args)
+
+    def view():
+        dice.output = dice.MemorySink()
+        veteran.viewProfile('full')
+    return view
+
+
+@benchmark('hall')
+def benchHall(args):
+    historyUniverse(args)
+
+    def view():
+        dice.output = dice.MemorySink()
+        dice.viewHall('full')
+    return view
+
+
+def traceMemory(prepare):
+    # memory is traced on a separate run because tracing slows everything down; returns the peak and
+    # what was still allocated afterwards, in KiB
+    operation = prepare()
+    tracemalloc.start()
+    operation()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024, current / 1024
+
+
+def saveReport(args, results, prefix = '', skip = ('out',)):
+    params = {key: value for key, value in vars(args).items() if key not in skip}
+    report = {
+        'timestamp': datetime.now().isoformat(timespec = 'seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'results': results
+    }
+    out = args.out or path.join('bench_results', f'{prefix}{report["timestamp"].replace(":", "-")}.json')
+    if path.dirname(out):
+        makedirs(path.dirname(out), exist_ok = True)
+    with open(out, 'w') as file:
+        json.dump(report, file, indent = 2)
+    print(f'\nResults were saved to "{out}".')
+
+
+def measure(name, args):
+    def prepare():
+        setUp(args)
+        return BENCHMARKS[name](args)
+
+    operation = prepare()
+    ops = 0
+    start = perf_counter()
+    while True:
+        operation()
+        ops += 1
+        elapsed = perf_counter() - start
+        if elapsed >= args.min_time and ops >= args.min_ops:
+            break
+
+    peak, _ = traceMemory(prepare)
+    return {'ops': ops, 'seconds': elapsed, 'opsPerSec': ops / elapsed, 'peakKiB': peak}
+
+
+def main(argv = None):
+    parser = ArgumentParser(description = 'Benchmarks for the hot paths of the dice simulator.')
+    parser.add_argument('names', nargs = '*', metavar = 'benchmark', help = f'any of: {", ".join(BENCHMARKS)}')
+    parser.add_argument('--dice', type = int, default = 20, help = 'dice per division for league benchmarks')
+    parser.add_argument('--game-length', type = int, default = dice.GAME_LENGTH, help = 'rolls per match')
+    parser.add_argument('--history', type = int, default = 200, \
+                        help = 'seasons of history to build for the profile and hall benchmarks')
+    parser.add_argument('--engine', choices = ['python', 'numpy', 'sampled'], default = dice.ENGINE)
+    parser.add_argument('--workers', type = int, default = dice.WORKERS, help = 'worker processes for the divisions')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--min-time', type = float, default = 1, help = 'seconds to run each benchmark for')
+    parser.add_argument('--min-ops', type = int, default = 3, help = 'fewest operations to time')
+    parser.add_argument('--out', help = 'where to save the results (defaults to bench_results/<timestamp>.json)')
+    parser.add_argument('--compare', metavar = 'JSON', help = 'earlier results to compare against')
+    args = parser.parse_args(argv)
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark "{name}"')
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+
+    results = {}
+    data = [['Benchmark', 'Ops', 'Ops/s', 'Peak KiB', '!c;vs base']]
+    for name in names:
+        results[name] = result = measure(name, args)
+        change = ''
+        if name in baseline:
+            change = f'{result["opsPerSec"] / baseline[name]["opsPerSec"]:.2f}x'
+        data.append([name, result['ops'], f'{result["opsPerSec"]:.1f}', f'{result["peakKiB"]:.1f}', f'!c;{change}'])
+    dice.printTable(data, [1], dice.StdoutSink())
+
+    saveReport(args, results, skip = ('names', 'out', 'compare'))
+
+
+if __name__ == '__main__':
+    main()
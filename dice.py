@@ -1,32 +1,65 @@
-from random import randint, choice
-from time import sleep
-from math import factorial
-from matplotlib.pyplot import subplots, show, legend
+from random import Random, randint, choice, seed, getrandbits, getstate, setstate
+from time import sleep, perf_counter
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict, Counter
+from os import cpu_count, replace, fsync
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from importlib.util import find_spec, module_from_spec, LazyLoader
+import pickle
+import json
+import sys
+
+
+def lazyImport(name):
+    # the module is only run once one of its attributes is used, so importing dice doesn't pay for numpy
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = find_spec(name)
+    if spec is None:
+        return None
+    spec.loader = LazyLoader(spec.loader)
+    module = module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+np = lazyImport('numpy')
 
 
 def parseCommand():
-    while True:
-        command = input('> ').split()
-        print()
-        if not command:
-            command = ''
-        elif len(command) == 1:
-            command = command[0]
-            args = []
-        else:
-            args = command[1:]
-            command = command[0]
-    
-        match command:
-            case '/help':
-                print('''Commands:
-Enter (don't input anything) — simulate the next season;
-/tutorial                         — view the tutorial that explains how to read commands in detail;
-/profile dice full/until{number}? — view the profile of a dice including most recent {number} seasons;
-/graph dice1 dice2? ...           — view the full league history of (a) dice;
-/hall full/until{number}?         — view the Hall of Fame until position {number}.''')
-            case '/tutorial':
-                print('''Tutorial:
+    while runCommand(input('> ')):
+        pass
+
+
+def runCommand(line, live = False):
+    command = line.split()
+    print()
+    if not command:
+        command = ''
+    elif len(command) == 1:
+        command = command[0]
+        args = []
+    else:
+        args = command[1:]
+        command = command[0]
+
+    match command:
+        case '/help':
+            print('Commands:')
+            if not live:
+                # in live mode the seasons go on by themselves
+                print("Enter (don't input anything) — simulate the next season;")
+            print('''/tutorial                           — view the tutorial that explains how to read commands in detail;
+/profile dice full/until{number}?   — view the profile of a dice including most recent {number} seasons;
+/graph dice1 dice2? ... --out file? — view the full league history of (a) dice, or save it to an image file;
+/hall full/until{number}?           — view the Hall of Fame until position {number};
+/expected league?                   — view the pre-season expected standings of all leagues or of league number {league};
+/save file?                         — save the universe to a snapshot file that can be resumed with --resume.''')
+        case '/tutorial':
+            print('''Tutorial:
 1. Basics
 Inputs consist of commands and arguments.
 The command is the first word of the input.
@@ -59,98 +92,635 @@ can be skipped.
 That slash separates multiple argument forms ("full" and "until{number}") that may be used \
 depending on what you want to pass to the command. In this case passing "full" will \
 print every season while passing "until{number}" will only print {number} of the most recent ones.''')
-            case '/profile':
-                try:
-                    if not args:
-                        raise Exception('This command requires an argument. You can pass an argument \
+        case '/profile':
+            try:
+                if not args:
+                    raise Exception('This command requires an argument. You can pass an argument \
 like this:\n/command argument')
-                    if len(args) > 1:
-                        mode = args[1]
-                    else:
-                        mode = 'until10'
-                    find(args[0]).viewProfile(mode)
-                except Exception as e:
-                    print(e)
-            case '/graph':
-                try:
-                    if season < 2:
-                        raise Exception('Please wait until season 2 to use this command.\n\
+                if len(args) > 1:
+                    mode = args[1]
+                else:
+                    mode = 'until10'
+                find(args[0]).viewProfile(mode)
+            except Exception as e:
+                print(e)
+        case '/graph':
+            try:
+                if '--out' in args:
+                    i = args.index('--out')
+                    if i + 1 == len(args):
+                        raise Exception('"--out" requires a file name, like this:\n/graph dice --out file.png')
+                    viewGraph(args[:i] + args[i + 2:], args[i + 1])
+                else:
+                    viewGraph(args)
+            except Exception as e:
+                print(e)
+        case '/hall':
+            viewHall(args[0] if args else 'until5')
+        case '/expected':
+            try:
+                if not leagues:
+                    raise Exception('No season has been played yet.')
+                if args:
+                    levels = [league.level for league in leagues]
+                    if not args[0].isdigit() or int(args[0]) not in levels:
+                        raise Exception(f'Invalid command argument: there is no league number {args[0]}.')
+                    leagues[levels.index(int(args[0]))].viewExpected()
+                else:
+                    for league in leagues:
+                        league.viewExpected()
+            except Exception as e:
+                print(e)
+        case '/save':
+            try:
+                path = args[0] if args else SNAPSHOT_PATH
+                saveSnapshot(path, True)
+                print(f'The universe was saved to "{path}".')
+            except Exception as e:
+                print(e)
+        case '':
+            print()
+            return False
+        case _:
+            print('Invalid command. Use /help to get a list of valid commands.')
+    print()
+    return True
+
+
+def viewGraph(names, out = None):
+    if season < 2:
+        raise Exception('Please wait until season 2 to use this command.\n\
 There is not enough data for it yet.')
-                    if not args:
-                        raise Exception('This command requires an argument. You can pass an argument \
+    if not names:
+        raise Exception('This command requires an argument. You can pass an argument \
 like this:\n/command argument')
-                    ax = subplots()[1]
-                    ax.invert_yaxis()
-                    ovrCount = 0
-                    for divCount, divColor in zip(DICE_COUNT + [0], DIV_COLORS + [ENDING_LINE_COLOR]):
-                        ax.plot(range(1, season + 1), [ovrCount + .5 for _ in range(1, season + 1)], \
-                                color=divColor, linestyle='dashed')
-                        ovrCount += divCount
-                    for dice in args:
-                        find(dice).plotHistory(ax)
-                    legend()
-                    show()
-                except Exception as e:
-                    print(e)
-            case '/hall':
-                hall = list(filter(lambda x: sum(x.titles), sorted(Dice.instances, key=lambda x: -x.titles[0])))
-                if len(args):
-                    mode = args[0]
-                else:
-                    mode = 'until5'
-                try:
-                    until = int(mode.removeprefix('until'))
-                except:
-                    until = False
-                if until and len(hall) >= until:
-                    hall = hall[:until]
-                
-                data = [['№', 'Dice', 'League', 'G', 'S', 'B']]
-                for i, dice in enumerate(hall, 1):
-                    data.append([i, dice.name, dice.league.name, dice.titles[0], dice.titles[1], dice.titles[2]])
-                printTable(data, [0, 1])
-            case '':
-                print()
-                break
-            case _:
-                print('Invalid command. Use /help to get a list of valid commands.')
-        print()
+    # matplotlib is only loaded once a graph is requested; files are drawn on their own Agg canvas, so saving one
+    # doesn't switch the backend that later interactive graphs use
+    if out:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        ax = figure.subplots()
+    else:
+        from matplotlib.pyplot import subplots, show
+        figure, ax = subplots()
+
+    ax.invert_yaxis()
+    ovrCount = 0
+    for divCount, divColor in zip(DICE_COUNT + [0], DIV_COLORS + [ENDING_LINE_COLOR]):
+        ax.plot(range(1, season + 1), [ovrCount + .5 for _ in range(1, season + 1)], \
+                color=divColor, linestyle='dashed')
+        ovrCount += divCount
+    for dice in names:
+        find(dice).plotHistory(ax)
+    ax.legend()
+    if out:
+        figure.savefig(out)
+        print(f'The graph was saved to "{out}".')
+    else:
+        show()
+
+
+def viewHall(mode = 'until5'):
+    try:
+        until = int(mode.removeprefix('until'))
+    except:
+        until = False
+
+    data = [['№', 'Dice', 'League', *TITLE_NAMES[:DIV_COUNT]]]
+    for i, dice in enumerate(hall.top(until or None), 1):
+        data.append([i, dice.name, dice.league.name, *dice.titles[:len(TITLE_NAMES)]])
+    printTable(data, [0, 1])
 
 
 def find(origTarget):
-    target = str(origTarget).lower()
-    for obj in Dice.instances:
-        if obj.name.lower() == target:
-            return obj
-    raise Exception(f'Invalid command argument: object "{origTarget}" was not found.')
+    obj = Dice.index.get(str(origTarget).lower())
+    if obj is None:
+        raise Exception(f'Invalid command argument: object "{origTarget}" was not found.')
+    return obj
 
 
-def printTable(data, doubleSep = []):
+def printTable(data, doubleSep = [], sink = None):
+    sink = sink or output
+    if sink.null:
+        return
     if len(data[0]) != len(data[1]):
         raise Exception('printTable(): not enough headers.')
     columnLens = [max(len(str(cell).removeprefix('!c;')) for cell in column) for column in zip(*data)]
+    centered = [header.find('!c;') != -1 for header in data[0]]
+    lines = []
     for row in data:
+        line = ''
         for i, cell, columnLen in zip(range(len(row)), row, columnLens):
             if i in doubleSep:
-                print('| ', end = '')
+                line += '| '
             elif i:
-                print(' ', end = '')
-            print(str(cell).removeprefix('!c;').center(columnLen) if data[0][i].find('!c;') != -1 else \
-                  str(cell).ljust(columnLen), end = ' |\n' if i == len(row) - 1 else ' |')
+                line += ' '
+            cell = str(cell).removeprefix('!c;')
+            line += (cell.center(columnLen) if centered[i] else cell.ljust(columnLen)) + ' |'
+        lines.append(line)
+    sink.write('\n'.join(lines) + '\n')
+
+
+class Sink:
+    # where rendered tables go; a null sink makes the renderers skip formatting altogether
+    null = False
+
+    def write(self, text):
+        pass
+
+    def close(self):
+        pass
+
+
+class StdoutSink(Sink):
+    def write(self, text):
+        sys.stdout.write(text)
 
 
+class FileSink(Sink):
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding = 'utf-8')
+
+    def write(self, text):
+        self.file.write(text)
+
+    def close(self):
+        self.file.close()
+
+
+class MemorySink(Sink):
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+class NullSink(Sink):
+    null = True
+
+
+class EventLog:
+    # hands batches of match records to the subscribers; leagues only collect them while someone is listening
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def emit(self, records):
+        for callback in self.subscribers:
+            callback(records)
+
+
+class EventSink:
+    # buffers encoded records and writes them out a batch at a time, so memory stays bounded on long runs
+    def __init__(self, path, batchSize):
+        self.file = open(path, 'wb')
+        self.batchSize = batchSize
+        self.buffer = []
+
+    def write(self, records):
+        self.buffer.extend(self.encode(record) for record in records)
+        if len(self.buffer) >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        self.file.write(b''.join(self.buffer))
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class JsonlEventSink(EventSink):
+    def encode(self, record):
+        return (json.dumps(record, separators = (',', ':')) + '\n').encode()
+
+
+class BinaryEventSink(EventSink):
+    def __init__(self, path, batchSize):
+        super().__init__(path, batchSize)
+        self.file.write(EVENT_MAGIC + GAME_LENGTH.to_bytes(2, 'little'))
+
+    def encode(self, record):
+        season, level, tour, d1, d2, rolls1, rolls2, score1, score2 = record
+        # sampled matches have no rolls, they are padded with dashes
+        rolls = rolls1.ljust(GAME_LENGTH, '-') + rolls2.ljust(GAME_LENGTH, '-')
+        return EVENT_RECORD.pack(season, level, tour, d1, d2, score1, score2) + rolls.encode()
+
+
+
+class LruCache:
+    def __init__(self, size):
+        self.size = size
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, calc):
+        if key in self.data:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+        self.misses += 1
+        value = calc()
+        self.data[key] = value
+        if len(self.data) > self.size:
+            self.data.popitem(last = False)
+        return value
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class Instruments:
+    # (class or None for a module function, function name, phase); times are inclusive of nested phases
+    PHASES = [('League', '__init__', 'leagueSetup'), ('League', 'simDay', 'play'), ('League', 'simArrays', 'play'), \
+              ('League', 'simSampled', 'play'), ('League', 'buildOdds', 'oddsMatrix'), ('Match', 'scoreProbs', 'odds'), \
+              ('Dice', 'update', 'update'), ('League', 'order', 'order'), \
+              (None, 'playLeagues', 'play'), \
+              (None, 'printTable', 'render'), (None, 'promote', 'promotion')]
+
+    def __init__(self):
+        self.enabled = False
+        self.format = 'table'
+        self.sink = None
+        self.originals = []
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.reset()
+
+    def reset(self):
+        self.seconds.clear()
+        self.calls.clear()
+        self.oddsHits = oddsCache.hits
+        self.oddsMisses = oddsCache.misses
+
+    def wrap(self, func, phase):
+        seconds = self.seconds
+        calls = self.calls
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds[phase] += perf_counter() - start
+                calls[phase] += 1
+        return timed
+
+    def enable(self, format = 'table', sink = None):
+        # the timers are only wrapped around the functions while enabled, so they cost nothing when off
+        self.format = format
+        self.sink = sink or StdoutSink()
+        if self.enabled:
+            return
+        self.enabled = True
+        self.reset()
+        for owner, name, phase in self.PHASES:
+            target = globals()[owner] if owner else None
+            original = vars(target)[name] if owner else globals()[name]
+            self.originals.append((target, name, original))
+            if owner:
+                timed = self.wrap(getattr(target, name), phase)
+                setattr(target, name, staticmethod(timed) if isinstance(original, staticmethod) else timed)
+            else:
+                globals()[name] = self.wrap(original, phase)
+
+    def disable(self):
+        for target, name, func in reversed(self.originals):
+            if target:
+                setattr(target, name, func)
+            else:
+                globals()[name] = func
+        self.originals = []
+        self.enabled = False
+
+    def stats(self, matches):
+        return {
+            'season': season,
+            'phases': {phase: {'calls': self.calls[phase], 'seconds': round(self.seconds[phase], 6)} \
+                       for phase in dict.fromkeys(phase for _, _, phase in self.PHASES)},
+            'counters': {
+                'matches': matches,
+                # the sampled engine draws each score directly and rolls nothing
+                'rolls': 0 if ENGINE == 'sampled' else matches * GAME_LENGTH * 2,
+                'oddsCacheMisses': oddsCache.misses - self.oddsMisses,
+                'oddsCacheHits': oddsCache.hits - self.oddsHits
+            }
+        }
+
+    def dump(self, matches):
+        stats = self.stats(matches)
+        if self.format == 'json':
+            self.sink.write(json.dumps(stats) + '\n')
+        else:
+            data = [['Phase', 'Calls', 'Seconds']]
+            for phase, phaseStats in stats['phases'].items():
+                data.append([phase, phaseStats['calls'], f'{phaseStats["seconds"]:.4f}'])
+            data += [[counter, value, ''] for counter, value in stats['counters'].items()]
+            self.sink.write(f'Season {season} profile:\n')
+            printTable(data, [1], self.sink)
+            self.sink.write('\n')
+        self.reset()
+
+
+class HallOfFame:
+    # every dice with a title, kept sorted by golds, then silvers, then bronzes, so the top k is just a slice
+    def __init__(self):
+        self.entries = []
+        self.keys = {}
+
+    def award(self, dice):
+        key = self.keys.get(dice.id)
+        if key:
+            del self.entries[bisect_left(self.entries, key)]
+        self.keys[dice.id] = key = (tuple(-titles for titles in dice.titles), dice.id)
+        insort(self.entries, key)
+
+    def top(self, k = None):
+        return [Dice.instances[id] for _, id in self.entries[:k]]
+
+    def rebuild(self):
+        self.entries = []
+        self.keys = {}
+        for dice in Dice.instances:
+            if sum(dice.titles):
+                self.award(dice)
+
+
+class History:
+    # one typed array per field, a row per dice per season
+    FIELDS = {'dice': 'I', 'season': 'I', 'level': 'H', 'pos': 'I', 'w': 'I', 't': 'I', 'l': 'I', \
+              'sd': 'i', 'tr': 'I', 'xpts': 'd', 'pts': 'I'}
+
+    def __init__(self):
+        self.columns = {field: array(code) for field, code in self.FIELDS.items()}
+        self.sides = array('H')
+        self.rows = {}
+        # rows of a loaded snapshot, grouped by dice: rowOrder[rowStart[id]:rowStart[id + 1]]
+        self.rowOrder = None
+        self.rowStart = None
+        self.dead = 0 # rows of archived dice that are still in the columns
+
+    def __len__(self):
+        return len(self.columns['dice'])
+
+    def append(self, dice, **values):
+        self.thaw()
+        self.rows.setdefault(dice.id, array('I')).append(len(self))
+        values['dice'] = dice.id
+        for field, column in self.columns.items():
+            column.append(values[field])
+        self.sides.extend(dice.sideVals)
+
+    def diceRows(self, diceId):
+        if diceId in self.rows:
+            return self.rows[diceId]
+        if self.rowStart is not None and diceId + 1 < len(self.rowStart):
+            return self.rowOrder[self.rowStart[diceId]:self.rowStart[diceId + 1]]
+        return array('I')
+
+    def view(self, diceId):
+        return HistoryView(self, self.diceRows(diceId))
+
+    def thaw(self):
+        # a loaded history is read straight from the mapped snapshot until a new season is added
+        if self.rowStart is None:
+            return
+        for field, code in self.FIELDS.items():
+            self.columns[field] = array(code, self.columns[field].tobytes())
+        self.sides = array('H', self.sides.tobytes())
+        self.rows = {}
+        for diceId in range(len(self.rowStart) - 1):
+            if self.rowStart[diceId] < self.rowStart[diceId + 1]:
+                self.rows[diceId] = array('I', self.diceRows(diceId).tobytes())
+        self.rowOrder = self.rowStart = None
+
+    def extract(self, diceId):
+        # takes the rows of a dice out for the archive; the columns are compacted once they are mostly dead rows
+        self.thaw()
+        rows = self.rows.pop(diceId, array('I'))
+        extracted = {field: array(code, (self.columns[field][row] for row in rows)) for field, code in self.FIELDS.items()}
+        extracted['sides'] = array('H', (side for row in rows for side in self.sides[row * 6:row * 6 + 6]))
+        self.dead += len(rows)
+        if self.dead * 2 > len(self):
+            self.compact()
+        return extracted
+
+    def compact(self):
+        order = sorted(row for rows in self.rows.values() for row in rows)
+        newRow = {row: i for i, row in enumerate(order)}
+        self.columns = {field: array(code, (self.columns[field][row] for row in order)) \
+                        for field, code in self.FIELDS.items()}
+        self.sides = array('H', (side for row in order for side in self.sides[row * 6:row * 6 + 6]))
+        self.rows = {diceId: array('I', (newRow[row] for row in rows)) for diceId, rows in self.rows.items()}
+        self.dead = 0
+
+    def sections(self, diceCount):
+        rowOrder = array('I')
+        rowStart = array('Q', [0])
+        for diceId in range(diceCount):
+            rowOrder.extend(self.diceRows(diceId))
+            rowStart.append(len(rowOrder))
+        return [(field, code, self.columns[field]) for field, code in self.FIELDS.items()] + \
+               [('sides', 'H', self.sides), ('rowOrder', 'I', rowOrder), ('rowStart', 'Q', rowStart)]
+
+    def save(self, file, diceCount):
+        layout = []
+        for name, code, section in self.sections(diceCount):
+            file.write(bytes(-file.tell() % 8))
+            data = memoryview(section).cast('B')
+            layout.append((name, code, file.tell(), len(data)))
+            file.write(data)
+        return layout
+
+    @classmethod
+    def fromSnapshot(cls, mapped, layout):
+        history = cls()
+        view = memoryview(mapped)
+        sections = {name: view[offset:offset + size].cast(code) for name, code, offset, size in layout}
+        history.columns = {field: sections[field] for field in cls.FIELDS}
+        history.sides = sections['sides']
+        history.rowOrder = sections['rowOrder']
+        history.rowStart = sections['rowStart']
+        history.dead = len(history) - len(history.rowOrder)
+        return history
+
+    @classmethod
+    def fromRows(cls, diceId, extracted):
+        history = cls()
+        history.columns = {field: extracted[field] for field in cls.FIELDS}
+        history.sides = extracted['sides']
+        history.rows = {diceId: array('I', range(len(extracted['dice'])))}
+        return history
+
+
+class Archive:
+    # retired dice and their history go to an append-only file and leave an ArchivedDice stub behind;
+    # records are read back on demand and the last few are kept in memory
+    def __init__(self, path, offsets = None):
+        self.path = path
+        self.file = open(path, 'a+b')
+        self.offsets = offsets or {}
+        self.cache = LruCache(ARCHIVE_CACHE_SIZE)
+        self.leagues = [League.restore(level, [], DIV_NAMES[level - 1]) for level in range(1, DIV_COUNT + 1)]
+
+    def store(self, dice):
+        record = pickle.dumps({'dice': dice.__getstate__(), 'level': dice.league.level, \
+                               'history': seasonHistory.extract(dice.id)}, pickle.HIGHEST_PROTOCOL)
+        self.file.seek(0, 2)
+        self.offsets[dice.id] = (self.file.tell(), len(record))
+        self.file.write(record)
+        stub = ArchivedDice(dice.id, dice.name, dice.titles, self.leagues[dice.league.level - 1])
+        Dice.instances[dice.id] = stub
+        Dice.index[dice.name.lower()] = stub
+
+    def load(self, diceId):
+        return self.cache.get(diceId, lambda: self.read(diceId))
+
+    def read(self, diceId):
+        offset, size = self.offsets[diceId]
+        self.file.flush()
+        self.file.seek(offset)
+        record = pickle.loads(self.file.read(size))
+        dice = Dice.__new__(Dice)
+        dice.__setstate__(record['dice'])
+        dice.league = self.leagues[record['level'] - 1]
+        return dice, History.fromRows(diceId, record['history'])
+
+    def sync(self):
+        # snapshots point into the file by offset, so every record has to be on disk before one is written
+        self.file.flush()
+        fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class ArchivedDice:
+    # all that stays in memory of an archived dice; anything else loads the full dice from the archive
+    __slots__ = ('id', 'name', 'titles', 'league')
+
+    def __init__(self, id, name, titles, league):
+        self.id = id
+        self.name = name
+        self.titles = titles
+        self.league = league
+
+    def __getattr__(self, name):
+        return getattr(archive.load(self.id)[0], name)
+
+
+def posChange(prevLevel, prevPos, level, pos):
+    if level == prevLevel:
+        result = prevPos - pos
+        if result > 0:
+            return f'{result}↑'
+        elif not result:
+            return '————'
+        return f'{result}↓'
+    elif level > prevLevel:
+        return 'Relg'
+    return 'Prom'
+
+
+class HistoryView:
+    def __init__(self, store, rows, start = 0, stop = None):
+        self.store = store
+        self.rows = rows
+        self.start = start
+        self.stop = len(rows) if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise Exception('History views can only be sliced with a step of 1.')
+            return HistoryView(self.store, self.rows, self.start + start, self.start + max(start, stop))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('History index out of range.')
+        return HistoryRow(self.store, self.rows, self.start + key)
+
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield HistoryRow(self.store, self.rows, i)
+
+    def column(self, field):
+        column = self.store.columns[field]
+        return [column[row] for row in self.rows[self.start:self.stop]]
+
+
+class HistoryRow:
+    def __init__(self, store, rows, i):
+        self.store = store
+        self.row = rows[i]
+        self.prevRow = rows[i - 1] if i else None
+
+    def __getitem__(self, key):
+        columns = self.store.columns
+        match key:
+            case 'sides':
+                return tuple(self.store.sides[self.row * 6:self.row * 6 + 6])
+            case 'strSides':
+                return ' '.join(str(side) for side in self['sides'])
+            case 'avr':
+                return round(sum(self['sides']) / 6, 1)
+            case 'league':
+                return DIV_NAMES[self['level'] - 1]
+            case 'p':
+                return self['w'] + self['t'] + self['l']
+            case 'dxpts':
+                return round(self['pts'] - self['xpts'], 1)
+            case 'apts':
+                return round(self['pts'] / self['p'], 1) if self['p'] else 0
+            case 'dpos':
+                if self.prevRow is None:
+                    return 'New!'
+                return posChange(columns['level'][self.prevRow], columns['pos'][self.prevRow], self['level'], self['pos'])
+        return columns[key][self.row]
+
 
 class Side:
+    __slots__ = ('val', 'i', 'w', 't', 'l')
+
     def __init__(self, val, i):
         self.val = val
         self.i = i
     
     def __str__(self):
         return str(self.val)
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if hasattr(self, slot)}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
      
 
 class Dice:
     instances = []
+    index = {} # lowercase name -> dice
+    __slots__ = ('sides', 'name', 'color', 'titles', 'id', 'league', 'w', 't', 'l', 'sd', 'tr', 'xpts')
+
     def __init__(self, quality, name = None):
         self.sides = [Side(side, i) for i, side in enumerate(sorted([randint(*quality) for _ in range(6)]), 1)]
         if not name:
@@ -158,9 +728,10 @@ class Dice:
         else:
             self.name = name
         self.getColor()
-        self.history = []
         self.titles = [0 for _ in range(DIV_COUNT)]
+        self.id = len(self.instances)
         self.instances.append(self)
+        self.index[self.name.lower()] = self
     
     def getName(self):
         while True:
@@ -173,9 +744,7 @@ class Dice:
                     nextVowel = not nextVowel
                 self.name += choice(vowels if nextVowel else consonants)
             self.name = self.name.capitalize()
-            try:
-                find(self.name)
-            except:
+            if self.name.lower() not in self.index:
                 break
     
     def getColor(self):
@@ -183,6 +752,31 @@ class Dice:
         for _ in range(6):
             self.color += choice('0123456789abcdef')
 
+    def __getstate__(self):
+        # plain data only; leagues are saved separately by saveSnapshot() so a dice doesn't drag in every past season
+        state = {slot: getattr(self, slot) for slot in self.__slots__ \
+                 if slot not in ('league', 'sides') and hasattr(self, slot)}
+        state['sides'] = [side.__getstate__() for side in self.sides]
+        return state
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self.sides = []
+        for sideState in state['sides']:
+            self.sides.append(Side.__new__(Side))
+            self.sides[-1].__setstate__(sideState)
+
+    @property
+    def history(self):
+        if archive and self.id in archive.offsets:
+            return archive.load(self.id)[1].view(self.id)
+        return seasonHistory.view(self.id)
+
+    @property
+    def sideVals(self):
+        return tuple(side.val for side in self.sides)
+
     @property
     def strSides(self):
         return ' '.join(str(side) for side in self.sides)
@@ -201,7 +795,7 @@ class Dice:
         
     @property
     def apts(self):
-        return round(self.pts / len(self.matches), 1)
+        return round(self.pts / self.p, 1) if self.p else 0
         
     @property
     def p(self):
@@ -213,62 +807,38 @@ class Dice:
 
     @property
     def pos(self):
-        return self.league.dice.index(self) + 1
+        return self.league.positions[self]
     
     @property
     def dpos(self):
         try:
-            if self.league.level == self.history[-1]['league'].level:
-                result = self.history[-1]['pos'] - self.pos
-                if result > 0:
-                    return f'{result}↑'
-                elif not result:
-                    return f'————'
-                return f'{result}↓'
-            elif self.league.level > self.history[-1]['league'].level:
-                return 'Relg'
-            return 'Prom'
-        except:
+            last = self.history[-1]
+        except IndexError:
             return 'New!'
+        return posChange(last['level'], last['pos'], self.league.level, self.pos)
         
     @classmethod
     def getRanking(self, historySeason):
         ranking = historySeason['pos']
         for i, divCount in enumerate(DICE_COUNT, 1):
-            if historySeason['league'].level == i:
+            if historySeason['level'] == i:
                 break
             ranking += divCount
         return ranking
 
     def roll(self):
-        return choice(self.sides)
+        return self.league.random.choice(self.sides)
     
     def update(self):
         dxpts = self.dxpts
         bonus = 0
         antibonus = 0
 
-        self.history.append({
-            'season': season,
-            'sides': self.sides,
-            'avr': self.avr,
-            'strSides': self.strSides,
-            'league': self.league,
-            'pos': self.pos,
-            'dpos': self.dpos,
-            'p': self.p,
-            'w': self.w,
-            't': self.t,
-            'l': self.l,
-            'sd': self.sd,
-            'tr': self.tr,
-            'xpts': self.xpts,
-            'dxpts': dxpts,
-            'pts': self.pts,
-            'apts': self.apts
-        })
+        seasonHistory.append(self, season = season, level = self.league.level, pos = self.pos, w = self.w, \
+                             t = self.t, l = self.l, sd = self.sd, tr = self.tr, xpts = self.xpts, pts = self.pts)
         if self.pos == 1:
             self.titles[self.league.level - 1] += 1
+            hall.award(self)
         
         if dxpts > 18:
             bonus += 1
@@ -284,8 +854,8 @@ class Dice:
             antibonus += 1
         
         for i in range(len(self.sides)):
-            if randint(1, 10) == 10:
-                self.sides[i] = Side(randint(*DICE_QUALITY[self.league.level - 1]), i)
+            if self.league.random.randint(1, 10) == 10:
+                self.sides[i] = Side(self.league.random.randint(*DICE_QUALITY[self.league.level - 1]), i)
         
         for _ in range(bonus):
             self.roll().val += 1
@@ -307,45 +877,45 @@ class Dice:
                     return f'{pos}rd'
             return f'{pos}th'
         
+        if output.null:
+            return
         try:
             until = int(mode.removeprefix('until'))
         except:
             until = False
-        if until and len(self.history) >= until:
-            history = self.history[-until:]
-        else:
-            history = self.history
+        history = self.history
+        if until and len(history) >= until:
+            history = history[-until:]
 
         data = [['№', 'Sides', 'Avr', 'League', 'Pos', '!c;ΔPos', '!c;SiD', 'ToR', 'xPts', 'ΔxPts', 'Pts']]
         for historySeason in history:
             data.append([historySeason['season'], historySeason['strSides'], historySeason['avr'], \
-                         historySeason['league'].name, formatPos(historySeason['pos']), historySeason['dpos'], \
+                         historySeason['league'], formatPos(historySeason['pos']), historySeason['dpos'], \
                          historySeason['sd'], historySeason['tr'], historySeason['xpts'], historySeason['dxpts'], \
                          historySeason['pts']])
 
-        print(f'''{self.name}'s profile:
+        output.write(f'''{self.name}'s profile:
 League: {self.league.name};
 Sides: {self.strSides};
 Average: {self.avr};
 Color: {self.color};
 
-History{f" (type \"/profile {self.name} full\" to see more)" if until and len(self.history) > 10 else ""}:''')
+History{f" (type \"/profile {self.name} full\" to see more)" if until and len(self.history) > 10 else ""}:\n''')
         printTable(data, [1, 3, 6, 8, 10])
 
     def plotHistory(self, ax):
-        ax.plot([historySeason['season'] for historySeason in self.history], [Dice.getRanking(historySeason) for historySeason in self.history], \
+        history = self.history
+        ax.plot(history.column('season'), [Dice.getRanking(historySeason) for historySeason in history], \
                 self.color, marker='o', label=self.name)
    
 
 class Match:
+    __slots__ = ('d1', 'd2', 'bye')
+
     def __init__(self, d1, d2):
         self.d1 = d1
         self.d2 = d2
         self.bye = not d1 or not d2
-        if self.d1:
-            self.d1.matches.append(self)
-        if self.d2:
-            self.d2.matches.append(self)
         
     def play(self, detail = False, fast = False):
         d1Score = 0
@@ -359,7 +929,10 @@ class Match:
         
         if detail:
             self.printCompare()
-        d1Odds, tieOdds, d2Odds = self.odds()
+        league = self.d1.league
+        log = league.log
+        rolls1 = rolls2 = ''
+        d1Odds, tieOdds, d2Odds = league.pairOdds(self.d1, self.d2)
         printIf(f'Odds to win/tie:\n{" " if d1Odds < 10 else ""}{d1Odds}% {self.d1.name} {self.d1.strSides}\n\
                 {" " if tieOdds < 10 else ""}{tieOdds}% {"vs".center(12 + max(len(self.d1.name), len(self.d2.name))," ")}\n\
                 {" " if d2Odds < 10 else ""}{d2Odds}% {self.d2.name} {self.d2.strSides}\n')
@@ -370,6 +943,9 @@ class Match:
             printIf(f'\nCurrent score: {d1Score}–{d2Score}.\nRoll {i}:', 2)
             d1Roll = self.d1.roll()
             d2Roll = self.d2.roll()
+            if log is not None:
+                rolls1 += str(self.d1.sides.index(d1Roll))
+                rolls2 += str(self.d2.sides.index(d2Roll))
             if d1Roll.val > d2Roll.val:
                 result = f'{d1Roll} > {d2Roll}, so {self.d1.name} wins.'
                 d1Score += 1
@@ -389,32 +965,41 @@ class Match:
             printIf(result)
         if d1Score > d2Score:
             gameResult = f'{self.d1.name} wins.'
+        elif d1Score < d2Score:
+            gameResult = f'{self.d2.name} wins.'
+        else:
+            gameResult = 'This is a tie.'
+        self.settle(d1Score, d2Score, rolls1, rolls2)
+        
+        printIf(f'\n\nFinal score: {d1Score}–{d2Score}.')
+        printIf(gameResult)
+        if detail:
+            input('\n\nPress Enter to finish the match: ')
+
+    def settle(self, d1Score, d2Score, rolls1 = '', rolls2 = ''):
+        league = self.d1.league
+        if d1Score > d2Score:
             self.d1.w += 1
             self.d2.l += 1
         elif d1Score < d2Score:
-            gameResult = f'{self.d2.name} wins.'
             self.d1.l += 1
             self.d2.w += 1
         else:
-            gameResult = 'This is a tie.'
             self.d1.t += 1
             self.d2.t += 1
-            
+
         self.d1.sd += d1Score - d2Score
         self.d2.sd += d2Score - d1Score
         self.d1.tr += d1Score
         self.d2.tr += d2Score
-        odds = self.odds()
-        self.d1.xpts += odds[0] * POINTS_PER_WIN / 100 + odds[1] * POINTS_PER_TIE / 100
-        self.d2.xpts += odds[1] * POINTS_PER_TIE / 100 + odds[2] * POINTS_PER_WIN / 100
+        if league.log is not None:
+            league.log.append((season, league.level, league.tour, self.d1.id, self.d2.id, rolls1, rolls2, d1Score, d2Score))
+        probs = league.pairProbs(self.d1, self.d2)
+        self.d1.xpts += probs[0] * POINTS_PER_WIN + probs[1] * POINTS_PER_TIE
+        self.d2.xpts += probs[1] * POINTS_PER_TIE + probs[2] * POINTS_PER_WIN
         self.d1.xpts = round(self.d1.xpts, 1)
         self.d2.xpts = round(self.d2.xpts, 1)
         
-        printIf(f'\n\nFinal score: {d1Score}–{d2Score}.')
-        printIf(gameResult)
-        if detail:
-            input('\n\nPress Enter to finish the match: ')
-        
     def compare(self, d1Fill = 1, d2Fill = 2, tieFill = 0, oneD = False):
         result = []
         for s1 in self.d1.sides:
@@ -430,10 +1015,28 @@ class Match:
             return [res for line in result for res in line]
         return result
     
+    def cached(self, kind, calc):
+        # odds of d2 vs d1 are the reverse of d1 vs d2, so both orders share one entry
+        sides1 = self.d1.sideVals
+        sides2 = self.d2.sideVals
+        if sides1 <= sides2:
+            return list(oddsCache.get((kind, sides1, sides2, GAME_LENGTH), calc))
+        return oddsCache.get((kind, sides2, sides1, GAME_LENGTH), lambda: calc()[::-1])[::-1]
+
     def comparePercent(self):
+        return self.cached('compare', self.calcComparePercent)
+
+    def compareCounts(self):
         comp = self.compare(oneD = True)
-        d1Percent = round(comp.count(1) / 36 * 100)
-        d2Percent = round(comp.count(2) / 36 * 100)
+        return comp.count(1), comp.count(2)
+
+    def calcComparePercent(self):
+        return self.percents(*self.compareCounts())
+
+    @staticmethod
+    def percents(d1Count, d2Count):
+        d1Percent = round(d1Count / 36 * 100)
+        d2Percent = round(d2Count / 36 * 100)
         tiePercent = 100 - d1Percent - d2Percent
         return [d1Percent, tiePercent, d2Percent]
     
@@ -451,37 +1054,58 @@ class Match:
         print('\n')
      
     def odds(self):
-        d1Percent, tiePercent, d2Percent = self.comparePercent()
-        d1Prob = d1Percent / 100
-        tieProb = tiePercent / 100
-        d2Prob = d2Percent / 100
-    
-        def binomial(p1, p2, p3, k1, k2, k3):
-            total = k1 + k2 + k3
-            return (factorial(total) / (factorial(k1) * factorial(k2) * factorial(k3))) * (p1**k1) * (p2**k2) * (p3**k3)
-    
-        d1Win = 0
-        tie = 0
-        d2Win = 0
-    
-        for k1 in range(GAME_LENGTH + 1):
-            for k2 in range(GAME_LENGTH + 1 - k1):
-                k3 = GAME_LENGTH - k1 - k2
-                prob = binomial(d1Prob, tieProb, d2Prob, k1, k2, k3)
-                if k1 > k3:
-                    d1Win += prob
-                elif k1 == k3:
-                    tie += prob
-                else:
-                    d2Win += prob
-   
+        return self.cached('odds', self.calcOdds)
+
+    def calcOdds(self):
+        return self.countOdds(*self.compareCounts())
+
+    @staticmethod
+    def countOdds(d1Count, d2Count):
+        d1Win, tie, d2Win = Match.countProbs(d1Count, d2Count)
         return [round(d1Win * 100), 100 - round(d1Win * 100) - round(d2Win * 100), round(d2Win * 100)]
 
+    @staticmethod
+    def countProbs(d1Count, d2Count):
+        # the odds only depend on how many of the 36 side pairs each dice wins
+        return oddsCache.get(('probs', d1Count, d2Count, GAME_LENGTH), \
+                             lambda: Match.scoreProbs(d1Count, d2Count, GAME_LENGTH))
+
+    @staticmethod
+    def scoreProbs(d1Count, d2Count, length):
+        # walks the distribution of the score difference roll by roll, index length meaning a level score
+        d1Prob = d1Count / 36
+        d2Prob = d2Count / 36
+        tieProb = (36 - d1Count - d2Count) / 36
+        if np and length > 50:
+            diff = np.zeros(2 * length + 1)
+            diff[length] = 1
+            for _ in range(length):
+                new = tieProb * diff
+                new[1:] += d1Prob * diff[:-1]
+                new[:-1] += d2Prob * diff[1:]
+                diff = new
+            return float(diff[length + 1:].sum()), float(diff[length]), float(diff[:length].sum())
+
+        diff = [0.0 for _ in range(2 * length + 1)]
+        diff[length] = 1.0
+        for roll in range(length):
+            new = list(diff)
+            for i in range(length - roll - 1, length + roll + 2):
+                new[i] = tieProb * diff[i] + (d1Prob * diff[i - 1] if i else 0) \
+                         + (d2Prob * diff[i + 1] if i < 2 * length else 0)
+            diff = new
+        return sum(diff[length + 1:]), diff[length], sum(diff[:length])
+
 
 class League:
-    def __init__(self, level, dice, name):
+    def __init__(self, level, dice, name, leagueSeed = None):
         self.level = level
         self.dice = dice
+        # every league rolls from its own stream, so it plays out the same wherever it is simulated
+        self.seed = leagueSeed
+        self.random = Random(leagueSeed)
+        self.log = [] if eventLog.subscribers else None
+        self.tour = 0
         for dice in self.dice:
             dice.league = self
             dice.w = 0 # wins
@@ -490,55 +1114,286 @@ class League:
             dice.sd = 0 # side difference
             dice.tr = 0 # total rolled
             dice.xpts = 0 # expected points
-            dice.matches = []
             for side in dice.sides:
                 side.w = 0 # rolls won
                 side.t = 0 # rolls tied
                 side.l = 0 # rolls lost
             
+        self.positions = {dice: i for i, dice in enumerate(self.dice, 1)}
         self.length = len(self.dice)
         self.name = name
+        self.played = False
+        self.seat()
 
-        self.matches = []
-        if self.length % 2:
-            
-            origTeams = list(self.dice) + [None]
-        else:
-            origTeams = list(self.dice)
-        teams = list(origTeams)
-        
-        for split in range(DUPE_MATCHES):
-            for round in range(self.length - 1):
-                round = []
-                for i in range(self.length // 2):
-                    match = Match(teams[i], teams[self.length - 1 - i])
-                    if not match.bye:
-                        round.append(match)
-                self.matches.append(round)
-            
-                teams.insert(1, teams.pop())
-            origTeams.reverse()
-            teams = origTeams
-        self.matchCount = len(self.matches)
+        # fixtures are worked out tour by tour in pairs(); an odd division gets an empty slot that means a bye
+        self.slotCount = self.length + self.length % 2
+        self.matchCount = DUPE_MATCHES * (self.slotCount - 1)
+        self.fixtureCount = self.matchCount * (self.length // 2)
+
+    def pairs(self, tour):
+        # circle method: slot 0 stays put while the others turn one step a tour; every other round robin
+        # repeats the same tours with home and away swapped
+        split, turn = divmod(tour - 1, self.slotCount - 1)
+        last = self.slotCount - 1
+
+        def entrant(position):
+            return 1 + (position - 1 - turn) % last if position else 0
+
+        pairs = []
+        for i in range(self.slotCount // 2):
+            d1, d2 = entrant(i), entrant(last - i)
+            if d1 < self.length and d2 < self.length:
+                pairs.append((d2, d1) if split % 2 else (d1, d2))
+        return pairs
+
+    def fixtures(self, tour):
+        return [Match(self.entrants[d1], self.entrants[d2]) for d1, d2 in self.pairs(tour)]
     
+    def seat(self):
+        # viewTable() reorders self.dice, so slots and results stay in this entrant order; the sides are the ones
+        # the season is played with, before Dice.update()
+        self.entrants = list(self.dice)
+        self.slots = {dice: i for i, dice in enumerate(self.entrants)}
+        self.sides = [dice.sideVals for dice in self.entrants]
+
+    def __getattr__(self, name):
+        # the pairwise matrices are built on first use, so a league whose games are played in a worker process
+        # never builds them in the parent
+        if name in ('countMatrix', 'probMatrix', 'oddsMatrix', 'xptsMatrix'):
+            self.buildOdds()
+            return getattr(self, name)
+        raise AttributeError(f"'League' object has no attribute '{name}'")
+
+    def buildOdds(self):
+        # sides don't change until Dice.update(), so the odds of every pairing are fixed for the season
+        if np:
+            sides = np.array(self.sides, int).reshape(-1, 6)
+            d1Counts = np.zeros((self.length, self.length), int)
+            d2Counts = np.zeros((self.length, self.length), int)
+            for a in range(6):
+                for b in range(6):
+                    d1Counts += sides[:, None, a] > sides[None, :, b]
+                    d2Counts += sides[:, None, a] < sides[None, :, b]
+            self.countMatrix = np.stack([d1Counts, d2Counts], 2).astype(np.uint8)
+            keys, inverse = np.unique((d1Counts * 37 + d2Counts).ravel(), return_inverse = True)
+            keys = keys.tolist()
+            probs = np.array([Match.countProbs(key // 37, key % 37) for key in keys], float).reshape(-1, 3)
+            odds = np.array([Match.countOdds(key // 37, key % 37) for key in keys], np.int8).reshape(-1, 3)
+            self.probMatrix = probs[inverse].reshape(self.length, self.length, 3)
+            self.oddsMatrix = odds[inverse].reshape(self.length, self.length, 3)
+            self.xptsMatrix = self.probMatrix[:, :, 0] * POINTS_PER_WIN + self.probMatrix[:, :, 1] * POINTS_PER_TIE
+        else:
+            self.countMatrix = counts = [[(sum(a > b for a in sides1 for b in sides2), \
+                                           sum(a < b for a in sides1 for b in sides2)) \
+                                          for sides2 in self.sides] for sides1 in self.sides]
+            self.probMatrix = [[Match.countProbs(*pair) for pair in row] for row in counts]
+            self.oddsMatrix = [[Match.countOdds(*pair) for pair in row] for row in counts]
+            self.xptsMatrix = [[probs[0] * POINTS_PER_WIN + probs[1] * POINTS_PER_TIE for probs in row] \
+                               for row in self.probMatrix]
+
+    def pairOdds(self, d1, d2):
+        if np:
+            return self.oddsMatrix[self.slots[d1], self.slots[d2]].tolist()
+        return list(self.oddsMatrix[self.slots[d1]][self.slots[d2]])
+
+    def pairCounts(self, pairs):
+        if np:
+            d1, d2 = np.array(pairs).T
+            return self.countMatrix[d1, d2].tolist()
+        return [self.countMatrix[d1][d2] for d1, d2 in pairs]
+
+    def pairProbs(self, d1, d2):
+        if np:
+            return self.probMatrix[self.slots[d1], self.slots[d2]].tolist()
+        return list(self.probMatrix[self.slots[d1]][self.slots[d2]])
+
+    def expectedStandings(self):
+        standings = []
+        for d1, i in self.slots.items():
+            expected = [0, 0, 0, 0]
+            for d2, j in self.slots.items():
+                if d1 is not d2:
+                    probs = self.pairProbs(d1, d2) + [float(self.xptsMatrix[i][j])]
+                    expected = [total + value for total, value in zip(expected, probs)]
+            standings.append((d1, self.sides[i], [DUPE_MATCHES * value for value in expected]))
+        return sorted(standings, key = lambda standing: -standing[2][3])
+
+    def viewExpected(self):
+        if output.null:
+            return
+        data = [['№', 'Dice', 'Sides', 'Avr', 'xW', 'xT', 'xL', 'xPts', '!c;Pos', 'Pts']]
+        for i, (dice, sides, (xw, xt, xl, xpts)) in enumerate(self.expectedStandings(), 1):
+            data.append([i, dice.name, ' '.join(str(side) for side in sides), round(sum(sides) / 6, 1), \
+                         round(xw, 1), round(xt, 1), round(xl, 1), round(xpts, 1), \
+                         f'!c;{self.positions[dice]}' if self.played else '!c;', dice.pts if self.played else ''])
+        output.write(f'\n\n{self.name} expected standings of season {season}:\n')
+        printTable(data, [0, 1, 4, 7, 8])
+        output.write('\n\n\n')
+
+    @classmethod
+    def restore(cls, level, dice, name):
+        league = cls.__new__(cls)
+        league.level = level
+        league.dice = dice
+        league.name = name
+        league.length = len(dice)
+        league.positions = {dice: i for i, dice in enumerate(dice, 1)}
+        league.tour = 0
+        league.matchCount = 0
+        league.fixtureCount = 0
+        league.played = True
+        league.seat()
+        return league
+
     def sim(self, detail = False):
-        for i in range(len(self.matches)):
+        if VIEW_EXPECTED:
+            self.viewExpected()
+        eachTour = VIEW_STANDINGS and (detail or VIEW_STANDINGS_EACH_TOUR)
+        self.play(detail, eachTour)
+        return self.finish(detail, eachTour)
+
+    def play(self, detail = False, eachTour = False):
+        if ENGINE == 'numpy' and not detail:
+            self.simArrays(eachTour)
+        elif ENGINE == 'sampled' and not detail:
+            self.simSampled(eachTour)
+        while self.tour < self.matchCount:
             self.simDay(detail)
-            if detail or VIEW_STANDINGS_EACH_TOUR:
-                self.viewTable()
+            if eachTour:
+                self.viewTable(detail)
 
-        if not detail and not VIEW_STANDINGS_EACH_TOUR:
-            self.viewTable(detail)
+    def finish(self, detail = False, eachTour = False):
+        self.played = True
+        if not eachTour:
+            if VIEW_STANDINGS:
+                self.viewTable(detail)
+            else:
+                self.order()
         for dice in self.dice:
             dice.update()
         return self
+
+    def tallies(self):
+        # everything a worker has to send back: the results in the original order and where the rolls left off
+        results = [(dice.w, dice.t, dice.l, dice.sd, dice.tr, dice.xpts, [(side.w, side.t, side.l) for side in dice.sides]) \
+                   for dice in self.dice]
+        return results, self.random.getstate()
+
+    def merge(self, tallies):
+        results, randomState = tallies
+        for dice, (w, t, l, sd, tr, xpts, sides) in zip(self.dice, results):
+            dice.w, dice.t, dice.l, dice.sd, dice.tr, dice.xpts = w, t, l, sd, tr, xpts
+            for side, (sw, st, sl) in zip(dice.sides, sides):
+                side.w, side.t, side.l = sw, st, sl
+        self.random.setstate(randomState)
+        self.tour = self.matchCount
     
+    def simArrays(self, eachTour = False):
+        if np is None:
+            raise Exception('The numpy engine requires numpy to be installed.')
+        sides = np.array(self.sides)
+        diceCount = self.length
+        sideCount = diceCount * 6
+        # seeded from the league's seed like self.random, and only made for the leagues this engine plays
+        npRandom = np.random.default_rng(self.seed)
+
+        def count(index, weights = None, length = diceCount):
+            return np.bincount(index, weights, length).astype(int)
+
+        w = t = l = sd = tr = xpts = 0
+        sideW = sideT = sideL = 0
+        while self.tour < self.matchCount:
+            # one batched draw for a single tour or for the whole remaining season
+            # big divisions are drawn a few tours at a time so the arrays stay bounded
+            batchTours = 1 if eachTour else max(1, ARRAY_BATCH_MATCHES // max(1, self.length // 2))
+            tours = range(self.tour + 1, min(self.tour + batchTours, self.matchCount) + 1)
+            self.tour = tours[-1]
+            fixtures = [(tour, pair) for tour in tours for pair in self.pairs(tour)]
+            d1, d2 = np.array([pair for _, pair in fixtures]).T
+            rolls = npRandom.integers(0, 6, (2, len(fixtures), GAME_LENGTH))
+            cells1 = d1[:, None] * 6 + rolls[0]
+            cells2 = d2[:, None] * 6 + rolls[1]
+            vals1 = sides.ravel()[cells1]
+            vals2 = sides.ravel()[cells2]
+            won = vals1 > vals2
+            lost = vals1 < vals2
+            tied = ~won & ~lost
+            d1Score = won.sum(1)
+            d2Score = lost.sum(1)
+            diff = d1Score - d2Score
+            if self.log is not None:
+                self.logArrays([tour for tour, _ in fixtures], d1, d2, rolls, d1Score, d2Score)
+
+            w = w + count(d1, diff > 0) + count(d2, diff < 0)
+            t = t + count(d1, diff == 0) + count(d2, diff == 0)
+            l = l + count(d1, diff < 0) + count(d2, diff > 0)
+            sd = sd + count(d1, diff) - count(d2, diff)
+            tr = tr + count(d1, d1Score) + count(d2, d2Score)
+            xpts = xpts + np.bincount(d1, self.xptsMatrix[d1, d2], diceCount) \
+                        + np.bincount(d2, self.xptsMatrix[d2, d1], diceCount)
+            sideW = sideW + count(cells1[won], length = sideCount) + count(cells2[lost], length = sideCount)
+            sideT = sideT + count(cells1[tied], length = sideCount) + count(cells2[tied], length = sideCount)
+            sideL = sideL + count(cells1[lost], length = sideCount) + count(cells2[won], length = sideCount)
+
+            for dice, dw, dt, dl, dsd, dtr, dxpts in zip(self.entrants, w.tolist(), t.tolist(), l.tolist(), \
+                                                        sd.tolist(), tr.tolist(), xpts.tolist()):
+                dice.w, dice.t, dice.l, dice.sd, dice.tr = dw, dt, dl, dsd, dtr
+                dice.xpts = round(dxpts, 1)
+            for side, sw, st, sl in zip([side for dice in self.entrants for side in dice.sides], \
+                                        sideW.tolist(), sideT.tolist(), sideL.tolist()):
+                side.w, side.t, side.l = sw, st, sl
+            if eachTour:
+                self.viewTable()
+
+    def simSampled(self, eachTour = False):
+        # draws the score of every match from the multinomial of rolls won, tied and lost instead of rolling
+        # GAME_LENGTH times; the per-side roll stats are not kept in this mode
+        random = self.random
+        while self.tour < self.matchCount:
+            self.tour += 1
+            pairs = self.pairs(self.tour)
+            for (d1, d2), (d1Count, d2Count) in zip(pairs, self.pairCounts(pairs)):
+                d1Score = random.binomialvariate(GAME_LENGTH, d1Count / 36)
+                # the rolls d1 didn't win are tied or lost in proportion to their cells
+                d2Score = random.binomialvariate(GAME_LENGTH - d1Score, d2Count / (36 - d1Count)) if d1Count < 36 else 0
+                Match(self.entrants[d1], self.entrants[d2]).settle(d1Score, d2Score)
+            self.flush()
+            if eachTour:
+                self.viewTable()
+
+    def logArrays(self, tours, d1, d2, rolls, d1Score, d2Score):
+        # side indices become digit strings, one character per roll
+        ids = [dice.id for dice in self.entrants]
+        rolls1, rolls2 = [(rolls[i] + 48).astype(np.uint8).view(f'S{GAME_LENGTH}').ravel().tolist() for i in (0, 1)]
+        self.log.extend((season, self.level, tour, ids[i], ids[j], r1.decode(), r2.decode(), s1, s2) \
+                        for tour, i, j, r1, r2, s1, s2 in zip(tours, d1.tolist(), d2.tolist(), rolls1, rolls2, \
+                                                              d1Score.tolist(), d2Score.tolist()))
+        self.flush()
+
     def simDay(self, detail):
-        for match in self.matches.pop():
+        self.tour += 1
+        for match in self.fixtures(self.tour):
             match.play(detail, True)
+        self.flush()
+
+    def flush(self):
+        if self.log:
+            eventLog.emit(self.log)
+            self.log = []
+
+    @staticmethod
+    def standingsKey(dice):
+        # points first, then side difference, then total rolled
+        return (-dice.pts, -dice.sd, -dice.tr)
+
+    def order(self):
+        self.dice = sorted(self.dice, key=self.standingsKey)
+        self.positions = {dice: i for i, dice in enumerate(self.dice, 1)}
 
-    def viewTable(self, detail):
-        self.dice = sorted(self.dice, key=lambda dice: -dice.pts * 1000000 - dice.sd * 1000 - dice.tr)
+    def viewTable(self, detail = False):
+        self.order()
+        if output.null:
+            return
         data = [['№', '!c;ΔPos', 'Dice', 'Sides', 'Avr', 'P', 'W', 'T', 'L', '!c;SiD', 'ToR', 'xPts', 'ΔxPts', 'Pts', 'PPG']]
         for i, dice in enumerate(self.dice, 1):
             addon = ''
@@ -549,12 +1404,12 @@ class League:
             data.append([str(i) + addon, dice.dpos, dice.name, dice.strSides, dice.avr, dice.p, dice.w, dice.t, dice.l, \
                          dice.sd, dice.tr, dice.xpts, dice.dxpts, dice.pts, dice.apts])
         
-        print(f'\n\n{self.name} {f"standings after tour {self.matchCount - len(self.matches)}" if self.matches else \
-                "final standings"} of season {season}:')
+        output.write(f'\n\n{self.name} {f"standings after tour {self.tour}" if self.tour < self.matchCount else \
+                     "final standings"} of season {season}:\n')
         printTable(data, [0, 2, 5, 9, 11, 13])
         if detail:
             input('Press Enter to continue: ')
-        print('\n\n')
+        output.write('\n\n\n')
 
 
 
@@ -563,6 +1418,17 @@ DUPE_MATCHES = 2
 POINTS_PER_WIN = 3
 POINTS_PER_TIE = 1
 
+ODDS_CACHE_SIZE = 4096
+ARRAY_BATCH_MATCHES = 1 << 16 # most matches the numpy engine draws at once
+ARCHIVE_CACHE_SIZE = 32
+MC_HALL_SIZE = 10
+SNAPSHOT_PATH = 'universe.dice'
+SNAPSHOT_MAGIC = b'DICESNAP'
+# match records: (season, level, tour, d1 id, d2 id, d1 side indices, d2 side indices, d1 score, d2 score)
+EVENT_MAGIC = b'DICEVNTS'
+EVENT_RECORD = Struct('<IHIIIHH') # followed by the side indices of both dice as digits
+EVENT_BATCH_SIZE = 4096
+
 DIV_COUNT = 3
 DIV_NAMES = ['DiceRolls Gold League', 'DiceRolls Silver League', 'DiceRolls Bronze League']
 DICE_QUALITY = [[2, 6], [2, 5], [1, 5], [1, 4]]
@@ -570,25 +1436,611 @@ DICE_COUNT = [16, 20, 20]
 DIV_COLORS = ["#a08010", "#909090", "#e07010"]
 ENDING_LINE_COLOR = '#000000'
 PROMOTION_SPOTS = [3, 4, 1]
+TITLE_NAMES = ['G', 'S', 'B'] # only the titles of the top divisions are shown
+DEFAULT_DIV_COLOR = '#606060'
 
+VIEW_STANDINGS = True
 VIEW_STANDINGS_EACH_TOUR = False
+VIEW_EXPECTED = False # print the expected standings of every league before it is played
 DETAIL = False
+ENGINE = 'python' # 'python' rolls every die one by one, 'numpy' rolls whole tours/seasons at once,
+                  # 'sampled' draws every score without rolling and doesn't keep the side stats
+WORKERS = 1 # processes that play the divisions of a season side by side
 
+output = StdoutSink()
+oddsCache = LruCache(ODDS_CACHE_SIZE)
+instruments = Instruments()
+eventLog = EventLog()
+leaguePool = None
+seasonHistory = History()
+archive = None
+hall = HallOfFame()
 season = 0
 divs = []
-for j in range(DIV_COUNT):
-    divs.append([Dice(DICE_QUALITY[j]) for _ in range(1, DICE_COUNT[j] + 1)])
+leagues = []
+
+
+def seedAll(value):
+    # the leagues of every season are seeded from this stream
+    seed(value)
+
+
+def newUniverse():
+    global season, divs, leagues, seasonHistory, archive
+    Dice.instances = []
+    Dice.index = {}
+    seasonHistory = History()
+    if archive:
+        archive.close()
+    archive = None
+    hall.rebuild()
+    season = 0
+    divs = []
+    leagues = []
+    for j in range(DIV_COUNT):
+        divs.append([Dice(DICE_QUALITY[j]) for _ in range(1, DICE_COUNT[j] + 1)])
 
-while True:
+
+def simSeason(detail = False):
+    global season, leagues
     season += 1
-    for i, div in enumerate(divs):
-        divs[i] = League(i + 1, div, DIV_NAMES[i]).sim(DETAIL).dice
-    parseCommand()
+    leagues = [League(i + 1, div, DIV_NAMES[i], getrandbits(64)) for i, div in enumerate(divs)]
+    if WORKERS > 1 and not (VIEW_STANDINGS and (detail or VIEW_STANDINGS_EACH_TOUR)):
+        # divisions don't meet until promotion, so they are played side by side and finished in order
+        playLeagues(leagues)
+        for league in leagues:
+            if VIEW_EXPECTED:
+                league.viewExpected()
+            league.finish()
+    else:
+        for league in leagues:
+            league.sim(detail)
+    for i, league in enumerate(leagues):
+        # the final standings are copied into the division list, so promote() never touches a league's own list
+        divs[i][:] = league.dice
+    return sum(league.fixtureCount for league in leagues)
+
+
+def playLeague(job):
+    # runs in a worker on copies of the dice, so only the results (and the match records, if asked) travel back;
+    # the records come back in one piece, so a division's whole season of them is held at once in worker mode
+    global ENGINE, GAME_LENGTH, season
+    level, diceStates, name, leagueSeed, ENGINE, GAME_LENGTH, season, logEvents = job
+    dice = []
+    for diceState in diceStates:
+        dice.append(Dice.__new__(Dice))
+        dice[-1].__setstate__(diceState)
+    records = []
+    # a forked worker inherits the parent's subscribers, whose sinks share the parent's open files, so they are
+    # replaced rather than added to; the records only reach the sinks once the parent emits them
+    eventLog.subscribers = [records.extend] if logEvents else []
+    league = League(level, dice, name, leagueSeed)
+    league.play()
+    return league.tallies(), records
+
+
+def playLeagues(leagues):
+    global leaguePool
+    if leaguePool is None:
+        from concurrent.futures import ProcessPoolExecutor
+        leaguePool = ProcessPoolExecutor(WORKERS)
+    jobs = [(league.level, [dice.__getstate__() for dice in league.dice], league.name, league.seed, ENGINE, GAME_LENGTH, \
+             season, bool(eventLog.subscribers)) for league in leagues]
+    for league, (tallies, records) in zip(leagues, leaguePool.map(playLeague, jobs)):
+        league.merge(tallies)
+        if records:
+            eventLog.emit(records)
+
+
+def promote():
+    # only the dice that move are touched: the bottom of every division swaps places with the top of the next
+    for i in range(DIV_COUNT - 1):
+        spots = PROMOTION_SPOTS[i]
+        if spots:
+            divs[i][-spots:], divs[i + 1][:spots] = divs[i + 1][:spots], divs[i][-spots:]
+    spots = PROMOTION_SPOTS[-1]
+    if spots:
+        retired = divs[-1][-spots:]
+        divs[-1][-spots:] = [Dice(DICE_QUALITY[-1]) for _ in range(spots)]
+        if archive:
+            for dice in retired:
+                archive.store(dice)
+
+
+def configure(config):
+    # sets up the pyramid: {"divisions": [{"name", "dice", "quality", "promotion", "color"?}, ...], "newDice": quality}
+    global DIV_COUNT, DIV_NAMES, DICE_QUALITY, DICE_COUNT, DIV_COLORS, PROMOTION_SPOTS
+    divisions = config['divisions']
+    if not divisions:
+        raise Exception('The configuration needs at least one division.')
+    for i, division in enumerate(divisions):
+        # the top of a division goes up and the bottom goes down (or retires), and the two must not overlap
+        above = divisions[i - 1]['promotion'] if i else 0
+        if division['dice'] < 2:
+            raise Exception(f'Division "{division["name"]}" needs at least 2 dice.')
+        if division['promotion'] < 0:
+            raise Exception(f'Division "{division["name"]}" can\'t relegate a negative number of dice.')
+        if above + division['promotion'] > division['dice']:
+            raise Exception(f'Division "{division["name"]}" has {division["dice"]} dice, too few to promote {above} \
+and relegate {division["promotion"]} of them.')
+    DIV_COUNT = len(divisions)
+    DIV_NAMES = [division['name'] for division in divisions]
+    DICE_QUALITY = [list(division['quality']) for division in divisions] + [list(config['newDice'])]
+    DICE_COUNT = [division['dice'] for division in divisions]
+    DIV_COLORS = [division.get('color', DEFAULT_DIV_COLOR) for division in divisions]
+    PROMOTION_SPOTS = [division['promotion'] for division in divisions]
+
+
+def topology():
+    divisions = [{'name': name, 'dice': count, 'quality': quality, 'promotion': spots, 'color': color} \
+                 for name, count, quality, spots, color in \
+                 zip(DIV_NAMES, DICE_COUNT, DICE_QUALITY, PROMOTION_SPOTS, DIV_COLORS)]
+    return {'divisions': divisions, 'newDice': DICE_QUALITY[-1]}
+
+
+def loadConfig(path):
+    with open(path, encoding = 'utf-8') as file:
+        configure(json.load(file))
 
-    for i in range(DIV_COUNT):
-        if i == DIV_COUNT - 1:
-            divs[i] = divs[i][:-PROMOTION_SPOTS[i]] + [Dice(DICE_QUALITY[-1]) for _ in range(PROMOTION_SPOTS[i])]
+
+def pyramid(tiers, size, promotion = None, quality = (1, 6)):
+    # a uniform pyramid of {tiers} divisions of {size} dice, mostly for scaling tests
+    promotion = max(1, size // 10) if promotion is None else promotion
+    divisions = [{'name': f'Division {level}', 'dice': size, 'quality': list(quality), 'promotion': promotion} \
+                 for level in range(1, tiers + 1)]
+    return {'divisions': divisions, 'newDice': list(quality)}
+
+
+def saveSnapshot(path, pendingPromotion = False):
+    # only the leagues of the active dice are saved in full, past leagues are kept as their level
+    active = {dice for div in divs for dice in div}
+    leagues = {}
+    leagueOf = []
+    for dice in Dice.instances:
+        league = getattr(dice, 'league', None)
+        if league is None:
+            leagueOf.append(0)
+        elif dice in active:
+            if id(league) not in leagues:
+                leagues[id(league)] = (len(leagues) + 1, (league.level, league.name, [dice.id for dice in league.dice]))
+            leagueOf.append(leagues[id(league)][0])
+        else:
+            leagueOf.append(-league.level)
+    state = {
+        'season': season,
+        'divs': [[dice.id for dice in div] for div in divs],
+        'dice': [None if isinstance(dice, ArchivedDice) else dice.__getstate__() for dice in Dice.instances],
+        'archive': archive and {'path': archive.path, 'offsets': archive.offsets, \
+                                'stubs': {dice.id: (dice.name, dice.titles) for dice in Dice.instances \
+                                          if isinstance(dice, ArchivedDice)}},
+        'leagues': [leagueState for _, leagueState in leagues.values()],
+        'leagueOf': leagueOf,
+        'random': getstate(),
+        'topology': topology(),
+        'pendingPromotion': pendingPromotion
+    }
+    if archive:
+        archive.sync()
+    with open(path + '.tmp', 'wb') as file:
+        file.write(SNAPSHOT_MAGIC)
+        state['history'] = seasonHistory.save(file, len(Dice.instances))
+        offset = file.tell()
+        pickle.dump(state, file, pickle.HIGHEST_PROTOCOL)
+        file.write(offset.to_bytes(8, 'little'))
+    replace(path + '.tmp', path)
+
+
+def loadSnapshot(path):
+    global season, divs, leagues, seasonHistory, archive
+    with open(path, 'rb') as file:
+        mapped = mmap(file.fileno(), 0, access = ACCESS_READ)
+    if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise Exception(f'"{path}" is not a universe snapshot.')
+    offset = int.from_bytes(mapped[-8:], 'little')
+    state = pickle.loads(mapped[offset:-8])
+    if 'topology' in state:
+        configure(state['topology'])
+
+    if archive:
+        archive.close()
+    archive = state.get('archive') and Archive(state['archive']['path'], state['archive']['offsets'])
+    Dice.instances = []
+    for i, diceState in enumerate(state['dice']):
+        if diceState is None:
+            Dice.instances.append(ArchivedDice(i, *state['archive']['stubs'][i], None))
             continue
-        divs[i], divs[i + 1] = divs[i][:-PROMOTION_SPOTS[i]] + divs[i + 1][:PROMOTION_SPOTS[i]], \
-                               divs[i][-PROMOTION_SPOTS[i]:] + divs[i + 1][PROMOTION_SPOTS[i]:]
-    
+        Dice.instances.append(Dice.__new__(Dice))
+        Dice.instances[-1].__setstate__(diceState)
+    Dice.index = {dice.name.lower(): dice for dice in Dice.instances}
+    restored = [League.restore(level, [Dice.instances[i] for i in ids], name) for level, name, ids in state['leagues']]
+    pastLeagues = [League.restore(level, [], DIV_NAMES[level - 1]) for level in range(1, DIV_COUNT + 1)]
+    for dice, leagueRef in zip(Dice.instances, state['leagueOf']):
+        if leagueRef > 0:
+            dice.league = restored[leagueRef - 1]
+        elif leagueRef < 0:
+            dice.league = pastLeagues[-leagueRef - 1]
+    divs = [[Dice.instances[i] for i in ids] for ids in state['divs']]
+    leagues = sorted(restored, key = lambda league: league.level)
+    season = state['season']
+    seasonHistory = History.fromSnapshot(mapped, state['history'])
+    hall.rebuild()
+    setstate(state['random'])
+    if state['pendingPromotion']:
+        promote()
+
+
+def repl():
+    while True:
+        simSeason(DETAIL)
+        parseCommand()
+        promote()
+
+
+class Live:
+    # seasons are played by a background task, one whole season per step, and commands run on the same
+    # event loop between steps, so they always see the last finished season
+    def __init__(self, rate = 0, paused = False):
+        import asyncio
+        self.rate = rate
+        self.running = asyncio.Event()
+        if not paused:
+            self.running.set()
+        self.played = 0
+        self.start = perf_counter()
+
+    async def seasons(self):
+        import asyncio
+        while True:
+            await self.running.wait()
+            start = perf_counter()
+            promote()
+            simSeason()
+            self.played += 1
+            await asyncio.sleep(max(0, 1 / self.rate - (perf_counter() - start)) if self.rate else 0)
+
+    async def serve(self):
+        # like the REPL, there is always a finished season to look at
+        import asyncio
+        simSeason()
+        task = asyncio.create_task(self.seasons())
+        try:
+            while True:
+                try:
+                    line = await asyncio.to_thread(input, '> ')
+                except EOFError:
+                    break
+                if task.done():
+                    task.result()
+                if not self.command(line):
+                    break
+        finally:
+            task.cancel()
+
+    def command(self, line):
+        command = line.split()
+        match command[:1]:
+            case []:
+                return True
+            case ['/help']:
+                runCommand(line, True)
+                print('''Live mode commands (seasons keep being simulated in the background):
+/pause                              — stop simulating after the current season;
+/resume                             — continue simulating;
+/rate seasons?                      — simulate at most {seasons} seasons per second, or as fast as possible without it;
+/status                             — view the current season and the simulation speed;
+/quit                               — stop the simulation and exit.\n''')
+            case ['/pause']:
+                self.running.clear()
+                print(f'\nPaused after season {season}.\n')
+            case ['/resume']:
+                self.running.set()
+                print('\nResumed.\n')
+            case ['/rate']:
+                try:
+                    rate = float(command[1]) if len(command) > 1 else 0
+                    if rate < 0:
+                        raise ValueError
+                    self.rate = rate
+                    print(f'\nThe target rate is now {f"{self.rate:g} seasons/s" if self.rate else "as fast as possible"}.\n')
+                except ValueError:
+                    print(f'\nInvalid command argument: "{command[1]}" is not a number of seasons per second.\n')
+            case ['/status']:
+                elapsed = perf_counter() - self.start
+                print(f'\nSeason {season}, {"running" if self.running.is_set() else "paused"}: \
+{self.played} seasons in {elapsed:.1f}s ({self.played / elapsed:.1f} seasons/s).\n')
+            case ['/quit']:
+                return False
+            case _:
+                runCommand(line)
+        return True
+
+
+def runBatch(seasons, autosave = 0, snapshotPath = None, profileSeasons = 0, profilePath = None):
+    start = perf_counter()
+    matches = 0
+    profiler = None
+    if profileSeasons:
+        from cProfile import Profile
+        profiler = Profile()
+    for i in range(seasons):
+        if profiler and i < profileSeasons:
+            profiler.enable()
+        seasonMatches = simSeason()
+        promote()
+        if profiler and i < profileSeasons:
+            profiler.disable()
+        matches += seasonMatches
+        if instruments.enabled:
+            instruments.dump(seasonMatches)
+        if autosave and not season % autosave:
+            saveSnapshot(snapshotPath or SNAPSHOT_PATH)
+    elapsed = perf_counter() - start
+    print(f'Simulated {seasons} seasons ({matches} matches) in {elapsed:.2f}s: \
+{seasons / elapsed:.1f} seasons/s, {matches / elapsed:.0f} matches/s.')
+    if profiler:
+        if profilePath:
+            profiler.dump_stats(profilePath)
+            print(f'cProfile stats of the first {profileSeasons} seasons were saved to "{profilePath}".')
+        else:
+            from pstats import Stats
+            Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+
+def streamEvents(seasons):
+    # plays the seasons and yields every match record. The records are handed over once a season is played, so a
+    # whole season of them (every fixture of every division) is held at a time; for big pyramids, write the stream
+    # through an EventSink instead, which holds at most a tour (a draw batch with the numpy engine) when the
+    # divisions are played in this process
+    records = []
+    eventLog.subscribe(records.extend)
+    try:
+        for _ in range(seasons):
+            simSeason()
+            yield from records
+            records.clear()
+            promote()
+    finally:
+        eventLog.unsubscribe(records.extend)
+
+
+def readEvents(path):
+    with open(path, 'rb') as file:
+        if file.read(len(EVENT_MAGIC)) != EVENT_MAGIC:
+            file.seek(0)
+            for line in file:
+                yield tuple(json.loads(line))
+            return
+        length = int.from_bytes(file.read(2), 'little')
+        size = EVENT_RECORD.size + 2 * length
+        while chunk := file.read(size * EVENT_BATCH_SIZE):
+            for offset in range(0, len(chunk), size):
+                season, level, tour, d1, d2, score1, score2 = EVENT_RECORD.unpack_from(chunk, offset)
+                rolls = chunk[offset + EVENT_RECORD.size:offset + size].decode()
+                yield season, level, tour, d1, d2, rolls[:length].rstrip('-'), rolls[length:].rstrip('-'), score1, score2
+
+
+def runUniverse(job):
+    global ENGINE, VIEW_STANDINGS
+    universe, universeSeed, seasons, engine, config = job
+    ENGINE = engine
+    configure(config)
+    VIEW_STANDINGS = False
+    seedAll(universeSeed)
+    newUniverse()
+    for _ in range(seasons):
+        simSeason()
+        promote()
+    return universeResults(universe)
+
+
+def universeResults(universe):
+    # dice are grouped by the quality they started with: one group per division, plus the bottom replacements
+    origins = DIV_COUNT + 1
+    result = {
+        'dice': [0 for _ in range(origins)],
+        'seasons': [0 for _ in range(origins)],
+        'prom': [0 for _ in range(origins)],
+        'relg': [0 for _ in range(origins)],
+        'titles': [[0 for _ in range(DIV_COUNT)] for _ in range(origins)],
+        'rankings': [[0 for _ in range(sum(DICE_COUNT))] for _ in range(origins)],
+        'goldSpells': Counter(),
+        'hall': []
+    }
+    starters = [j for j in range(DIV_COUNT) for _ in range(DICE_COUNT[j])]
+    for i, dice in enumerate(Dice.instances):
+        origin = starters[i] if i < len(starters) else DIV_COUNT
+        result['dice'][origin] += 1
+        result['seasons'][origin] += len(dice.history)
+        for j, titles in enumerate(dice.titles):
+            result['titles'][origin][j] += titles
+        if sum(dice.titles):
+            result['hall'].append((tuple(dice.titles), universe, dice.name))
+
+        spell = 0
+        prevLevel = None
+        for historySeason in dice.history:
+            level = historySeason['level']
+            result['rankings'][origin][Dice.getRanking(historySeason) - 1] += 1
+            if prevLevel and level < prevLevel:
+                result['prom'][origin] += 1
+            elif prevLevel and level > prevLevel:
+                result['relg'][origin] += 1
+            if level == 1:
+                spell += 1
+            elif spell:
+                result['goldSpells'][spell] += 1
+                spell = 0
+            prevLevel = level
+        if spell:
+            result['goldSpells'][spell] += 1
+    result['hall'] = sorted(result['hall'], reverse = True)[:MC_HALL_SIZE]
+    return result
+
+
+def mergeResults(total, result):
+    for key in ('dice', 'seasons', 'prom', 'relg'):
+        total[key] = [a + b for a, b in zip(total[key], result[key])]
+    for key in ('titles', 'rankings'):
+        total[key] = [[a + b for a, b in zip(row, newRow)] for row, newRow in zip(total[key], result[key])]
+    total['goldSpells'] += result['goldSpells']
+    total['hall'] = sorted(total['hall'] + result['hall'], reverse = True)[:MC_HALL_SIZE]
+    return total
+
+
+def monteCarlo(universes, seasons, masterSeed = None, workers = None, engine = None):
+    seeder = Random(masterSeed)
+    jobs = [(universe, seeder.getrandbits(64), seasons, engine or ENGINE, topology()) \
+            for universe in range(1, universes + 1)]
+    workers = workers or cpu_count()
+    total = None
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as pool:
+        for result in pool.map(runUniverse, jobs, chunksize = max(1, universes // (workers * 4))):
+            total = result if total is None else mergeResults(total, result)
+    return total
+
+
+def printMonteCarlo(total, universes, seasons):
+    origins = DIV_NAMES + ['New dice']
+    print(f'Results of {universes} universes, {seasons} seasons each:\n')
+
+    data = [['Started in', 'Dice', *TITLE_NAMES[:DIV_COUNT], 'Prom/season', 'Relg/season']]
+    for i, origin in enumerate(origins):
+        diceSeasons = total['seasons'][i] or 1
+        data.append([origin, total['dice'][i], *total['titles'][i][:len(TITLE_NAMES)], \
+                     f'{total["prom"][i] / diceSeasons:.3f}', f'{total["relg"][i] / diceSeasons:.3f}'])
+    printTable(data, [1, 2, 2 + min(DIV_COUNT, len(TITLE_NAMES))])
+
+    print('\nRanking distribution by starting division:')
+    data = [['Ranking'] + [f'!c;{origin}' for origin in origins]]
+    for ranking, counts in enumerate(zip(*total['rankings']), 1):
+        data.append([ranking] + [f'!c;{count / (total["seasons"][i] or 1) * 100:.1f}%' for i, count in enumerate(counts)])
+    printTable(data, [1])
+
+    print(f'\nSeasons in a row spent in {DIV_NAMES[0]}:')
+    data = [['Seasons', 'Spells']]
+    for length, count in sorted(total['goldSpells'].items()):
+        data.append([length, count])
+    printTable(data, [1])
+
+    print('\nHall of Fame of all universes:')
+    data = [['№', 'Universe', 'Dice', *TITLE_NAMES[:DIV_COUNT]]]
+    for i, (titles, universe, name) in enumerate(total['hall'], 1):
+        data.append([i, universe, name, *titles[:len(TITLE_NAMES)]])
+    printTable(data, [1, 3])
+
+
+def main(argv = None):
+    global ENGINE, WORKERS, VIEW_STANDINGS, output, archive
+    # argparse, asyncio, the process pool and cProfile are imported where they are used so that importing
+    # dice stays cheap
+    from argparse import ArgumentParser
+    parser = ArgumentParser(prog = 'python -m dice', description = 'DiceRolls league simulator.')
+    modes = parser.add_subparsers(dest = 'mode')
+    replParser = modes.add_parser('repl', help = 'simulate season by season with the interactive prompt (default)')
+    runParser = modes.add_parser('run', help = 'simulate seasons back to back without prompts')
+    runParser.add_argument('--seasons', type = int, default = 100, help = 'number of seasons to simulate')
+    runParser.add_argument('--quiet', action = 'store_true', help = "don't print the standings")
+    runParser.add_argument('--output', metavar = 'PATH', help = 'write the standings to a file instead of the terminal')
+    runParser.add_argument('--autosave', type = int, default = 0, metavar = 'N', \
+                           help = 'save a snapshot every N seasons')
+    runParser.add_argument('--snapshot', metavar = 'PATH', \
+                           help = f'where to save snapshots (defaults to {SNAPSHOT_PATH} when autosaving)')
+    runParser.add_argument('--profile', action = 'store_true', help = 'time the phases of every season')
+    runParser.add_argument('--profile-format', choices = ['table', 'json'], default = 'table')
+    runParser.add_argument('--profile-out', metavar = 'PATH', help = 'write the phase timings to a file')
+    runParser.add_argument('--cprofile', type = int, default = 0, metavar = 'N', \
+                           help = 'capture cProfile stats of the first N seasons')
+    runParser.add_argument('--cprofile-out', metavar = 'PATH', help = 'save the cProfile stats instead of printing them')
+    runParser.add_argument('--events', metavar = 'PATH', \
+                           help = 'stream a record of every match to a file; records are held a tour at a time '
+                                  '(a draw batch with the numpy engine), or a division\'s season with --workers above 1')
+    runParser.add_argument('--events-format', choices = ['jsonl', 'binary'], default = 'jsonl')
+    mcParser = modes.add_parser('mc', help = 'simulate many independent universes in parallel and aggregate them')
+    mcParser.add_argument('--universes', type = int, default = 100, help = 'number of independent universes')
+    mcParser.add_argument('--seasons', type = int, default = 100, help = 'number of seasons in each universe')
+    mcParser.add_argument('--workers', type = int, help = 'worker processes (defaults to the number of cores)')
+    liveParser = modes.add_parser('live', help = 'keep simulating seasons in the background while serving commands')
+    liveParser.add_argument('--rate', type = float, default = 0, help = 'target seasons per second (as fast as possible by default)')
+    liveParser.add_argument('--paused', action = 'store_true', help = 'start paused after the first season')
+    graphParser = modes.add_parser('graph', help = 'draw the ranking history of dice from a saved snapshot')
+    graphParser.add_argument('dice', nargs = '+', help = 'names of the dice to draw')
+    graphParser.add_argument('--resume', metavar = 'PATH', required = True, help = 'snapshot to read the universe from')
+    graphParser.add_argument('--out', metavar = 'PATH', help = 'save the graph to an image file instead of showing it')
+    for modeParser in (replParser, runParser, liveParser, mcParser):
+        modeParser.add_argument('--seed', type = int, help = 'seed for reproducible runs')
+        modeParser.add_argument('--config', metavar = 'PATH', help = 'JSON file describing the divisions')
+        modeParser.add_argument('--engine', choices = ['python', 'numpy', 'sampled'], default = ENGINE)
+    for modeParser in (replParser, runParser, liveParser):
+        modeParser.add_argument('--resume', metavar = 'PATH', help = 'continue a universe from a saved snapshot')
+        modeParser.add_argument('--workers', type = int, default = WORKERS, \
+                                help = 'worker processes that play the divisions of a season side by side')
+        modeParser.add_argument('--archive', metavar = 'PATH', \
+                                help = 'move retired dice to this file instead of keeping them in memory')
+    args = parser.parse_args(argv)
+
+    ENGINE = getattr(args, 'engine', ENGINE)
+    if getattr(args, 'config', None):
+        try:
+            loadConfig(args.config)
+        except Exception as e:
+            parser.error(f'invalid configuration "{args.config}": {e}')
+    if args.mode == 'mc':
+        start = perf_counter()
+        total = monteCarlo(args.universes, args.seasons, args.seed, args.workers)
+        printMonteCarlo(total, args.universes, args.seasons)
+        print(f'\nDone in {perf_counter() - start:.2f}s.')
+        return
+    WORKERS = getattr(args, 'workers', WORKERS)
+    if getattr(args, 'seed', None) is not None:
+        seedAll(args.seed)
+    if getattr(args, 'resume', None):
+        loadSnapshot(args.resume)
+    else:
+        newUniverse()
+    if getattr(args, 'archive', None) and not archive:
+        archive = Archive(args.archive)
+    eventSink = profileSink = None
+    try:
+        if args.mode == 'graph':
+            try:
+                viewGraph(args.dice, args.out)
+            except Exception as e:
+                print(e)
+        elif args.mode == 'run':
+            VIEW_STANDINGS = not args.quiet
+            if args.quiet:
+                output = NullSink()
+            elif args.output:
+                output = FileSink(args.output)
+            profileSink = FileSink(args.profile_out) if args.profile_out else None
+            if args.profile:
+                instruments.enable(args.profile_format, profileSink)
+            if args.events:
+                eventSink = (BinaryEventSink if args.events_format == 'binary' else JsonlEventSink)(args.events, EVENT_BATCH_SIZE)
+                eventLog.subscribe(eventSink.write)
+            runBatch(args.seasons, args.autosave, args.snapshot, args.cprofile, args.cprofile_out)
+            instruments.disable()
+            if args.snapshot or args.autosave:
+                saveSnapshot(args.snapshot or SNAPSHOT_PATH)
+        elif args.mode == 'live':
+            # the standings would scroll over the prompt, so live mode only prints what is asked for
+            VIEW_STANDINGS = False
+            import asyncio
+            asyncio.run(Live(args.rate, args.paused).serve())
+        else:
+            repl()
+    finally:
+        # an interrupted run still writes out what its sinks have buffered
+        if eventSink:
+            eventLog.unsubscribe(eventSink.write)
+            eventSink.close()
+        output.close()
+        if profileSink:
+            profileSink.close()
+        if archive:
+            archive.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from argparse import ArgumentParser
+from time import perf_counter
+
+from bench import setUp, traceMemory, saveReport
+import dice
+
+
+def season():
+    matches = dice.simSeason()
+    dice.promote()
+    return matches
+
+
+def measure(args, tiers, size):
+    config = dice.pyramid(tiers, size, args.promotion)
+    setUp(args, config)
+    # the first season builds the odds cache, so it is timed on its own
+    start = perf_counter()
+    matches = season()
+    first = perf_counter() - start
+    start = perf_counter()
+    for _ in range(args.seasons):
+        season()
+    elapsed = perf_counter() - start
+
+    def prepare():
+        # a season is played first, so the retained memory is that of a universe in its stride
+        setUp(args, config)
+        season()
+        return season
+
+    peak, retained = traceMemory(prepare)
+    return {'tiers': tiers, 'size': size, 'dice': tiers * size, 'matches': matches, 'firstSeason': first, \
+            'secondsPerSeason': elapsed / args.seasons, 'matchesPerSec': matches * args.seasons / elapsed, \
+            'peakKiB': peak, 'retainedKiB': retained}
+
+
+def main(argv = None):
+    parser = ArgumentParser(description = 'Measures how season time and memory grow with the number and size of divisions.')
+    parser.add_argument('--tiers', type = int, nargs = '+', default = [3, 6, 12, 24], help = 'division counts to try')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [20, 50, 100], help = 'dice per division to try')
+    parser.add_argument('--promotion', type = int, help = 'dice swapped between divisions (defaults to a tenth)')
+    parser.add_argument('--seasons', type = int, default = 3, help = 'seasons to time for every pyramid')
+    parser.add_argument('--game-length', type = int, default = dice.GAME_LENGTH, help = 'rolls per match')
+    parser.add_argument('--engine', choices = ['python', 'numpy', 'sampled'], default = 'numpy')
+    parser.add_argument('--workers', type = int, default = 1, help = 'worker processes for the divisions')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--out', help = 'where to save the results (defaults to bench_results/scale-<timestamp>.json)')
+    args = parser.parse_args(argv)
+
+    results = []
+    data = [['Tiers', 'Size', 'Dice', 'Matches', 'First s', 's/season', 'Matches/s', 'Peak KiB', 'Kept KiB']]
+    for tiers in args.tiers:
+        for size in args.sizes:
+            results.append(result := measure(args, tiers, size))
+            data.append([tiers, size, result['dice'], result['matches'], f'{result["firstSeason"]:.3f}', \
+                         f'{result["secondsPerSeason"]:.3f}', f'{result["matchesPerSec"]:.0f}', \
+                         f'{result["peakKiB"]:.0f}', f'{result["retainedKiB"]:.0f}'])
+            print(f'{tiers} tiers of {size} dice: {result["secondsPerSeason"]:.3f}s per season.')
+    print()
+    dice.printTable(data, [1, 3, 6], dice.StdoutSink())
+    saveReport(args, results, 'scale-')
+
+
+if __name__ == '__main__':
+    main()